@@ -5,12 +5,83 @@
 """
 
 import os
+import re
+import time
 import logging
-from typing import Optional, Dict, Any
+from urllib.parse import urljoin, urlparse
+from typing import Optional, Dict, Any, Tuple
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    TimeoutException,
+    NoSuchElementException,
+    WebDriverException,
+)
 
 from ..browser.helpers import BrowserHelper
 from ..browser.element_finder import ElementFinder
-from ..utils.timing import TimingManager
+
+
+# 登录状态与结果判断所用的选择器 / 提示文本，模块加载时构建一次
+_LOGIN_INDICATORS = (".vwmy", "a[href*='logout']", "#um")
+_LOGIN_INDICATOR_SELECTOR = ", ".join(_LOGIN_INDICATORS)
+# 已登录 / 游客登录框 / 提示信息，任一出现即可判断结果
+_LOGIN_OUTCOME_SELECTOR = ".vwmy, #lsform, #messagetext"
+_AGE_SELECTORS = ("a.enter-btn", "//a[contains(text(),'满18岁')]")
+# Discuz 表单元素 id 带随机 loginhash 后缀（如 username_xxxx），只能按前缀匹配；
+# 限定在主登录表单内，页头快捷登录框 #lsform 中同样有 username 输入框
+_LOGIN_FORM_SELECTOR = (
+    "form[name='login'] input[name='username'], "
+    "form[name='login'] input[id^='username_']"
+)
+# 一次脚本调用填写账号密码，并触发 input 事件让页面脚本感知；
+# 找不到主登录表单时直接返回 false，不回退到页头的快捷登录框
+_FILL_LOGIN_FORM_JS = (
+    "var f=document.querySelector(\"form[name='login']\");"
+    "if(!f)return false;"
+    "var u=f.querySelector(\"input[name='username'],input[id^='username_']\");"
+    "var p=f.querySelector(\"input[name='password'],input[id^='password3_']\");"
+    "if(!u||!p)return false;"
+    "u.value=arguments[0];p.value=arguments[1];"
+    # 勾选“自动登录”，登录 Cookie 才会持久化到浏览器配置目录
+    "var c=f.querySelector(\"input[name='cookietime']\");if(c)c.checked=true;"
+    "u.dispatchEvent(new Event('input',{bubbles:true}));"
+    "p.dispatchEvent(new Event('input',{bubbles:true}));"
+    "return true;"
+)
+_QUESTION_SELECTORS = ("select[name='questionid']", "select[id^='loginquestionid_']")
+_ANSWER_SELECTORS = ("input[name='answer']", "input[id^='loginanswer_']")
+# 在浏览器端按文本包含匹配并选中安全提问，避免逐个读取 option 文本；
+# 跳过 value 为 0 的“未设置”占位项
+_SELECT_QUESTION_JS = (
+    "for (const o of arguments[0].options) {"
+    "if (o.value !== '0' && o.text.includes(arguments[1])) {"
+    "arguments[0].value = o.value;"
+    "arguments[0].dispatchEvent(new Event('change', {bubbles: true}));"
+    "return true;}}"
+    "return false;"
+)
+_SUBMIT_SELECTORS = ("button[name='loginsubmit']", "button[id^='loginsubmit_']")
+# 提交后：已登录链接 / 错误提示，任一出现即可判断结果
+_SUBMIT_OUTCOME_SELECTOR = ".vwmy, a[href*='logout'], #messagetext, .alert_error"
+_LOGIN_ERRORS = ("用户名或密码错误", "密码错误次数过多", "账号已被禁用", "登录失败")
+_ERROR_RE = re.compile("|".join(re.escape(e) for e in _LOGIN_ERRORS))
+# 只取提示框文本，避免通过 page_source 传输整页 DOM；无提示框时才回退到 page_source
+_ERROR_TEXT_JS = (
+    "return Array.from(document.querySelectorAll('#messagetext,.alert_error'))"
+    ".map(function(e){return e.innerText;}).join('\\n').trim();"
+)
+# 登录流程中预期会出现的 Selenium 异常，其余异常直接向上抛出
+_SELENIUM_ERRORS = (TimeoutException, NoSuchElementException, WebDriverException)
+# 注入 Cookie 的有效期（与 Discuz 自动登录一致，30 天）；
+# 不带过期时间的会话 Cookie 不会写入浏览器配置目录
+_COOKIE_MAX_AGE = 30 * 24 * 3600
+
+
+class LoginRejectedError(Exception):
+    """站点明确拒绝登录（密码错误、账号锁定或禁用），重试无济于事"""
 
 
 class SignInManager:
@@ -23,65 +94,284 @@ class SignInManager:
         self.element_finder = ElementFinder(driver, self.logger)
 
         self.base_url = config.get("base_url", "https://www.sehuatang.org")
+        self._home_url = self.base_url.rstrip("/") + "/"
+        self._login_url = urljoin(self._home_url, "member.php?mod=logging&action=login")
+        self.username = config.get("username", "")
+        self.password = config.get("password", "")
+        self.enable_security_question = config.get("enable_security_question", False)
+        self.security_question = config.get("security_question", "")
+        self.security_answer = config.get("security_answer", "")
+
+        # 页面导航计数与页面文本缓存，同一页面内多次检查只读取一次
+        self._nav_counter = 0
+        self._page_cache: Optional[Tuple[int, str, bool]] = None
+
+    # =========================
+    # 页面导航与文本快照
+    # =========================
+    def _navigate(self, url: str) -> None:
+        self._nav_counter += 1
+        self.driver.get(url)
+
+    def _refresh(self) -> None:
+        self._nav_counter += 1
+        self.driver.refresh()
+
+    def _click(self, element) -> None:
+        self._nav_counter += 1
+        BrowserHelper.safe_click(self.driver, element, self.logger)
+
+    def _snapshot_page(self) -> Tuple[str, bool]:
+        """返回 (页面文本, 是否来自提示框)；无提示框时回退到 page_source"""
+        if self._page_cache and self._page_cache[0] == self._nav_counter:
+            return self._page_cache[1], self._page_cache[2]
+        text = self.driver.execute_script(_ERROR_TEXT_JS)
+        from_alert = bool(text)
+        if not from_alert:
+            text = self.driver.page_source
+        self._page_cache = (self._nav_counter, text, from_alert)
+        return text, from_alert
 
     # =========================
     # 登录状态判断
     # =========================
     def check_login_status(self) -> bool:
+        # 调用前已等待过页面结果元素，这里只做一次即时探测：
+        # WebDriverWait 即使 timeout=0 也会先休眠一个轮询周期
         try:
-            indicators = [
-                "//a[contains(text(),'退出')]",
-                "//a[contains(@href,'logout')]",
-                ".vwmy",
-            ]
-            el = self.element_finder.find_by_selectors(indicators, timeout=3)
-            return bool(el)
-        except Exception:
+            elements = self.driver.find_elements(
+                By.CSS_SELECTOR, _LOGIN_INDICATOR_SELECTOR
+            )
+            return any(el.is_displayed() for el in elements)
+        except _SELENIUM_ERRORS:
+            return False
+
+    def check_login_error_message(self) -> Tuple[Optional[str], bool]:
+        """返回 (匹配到的错误提示, 是否来自站点提示框)；来自 page_source 的匹配仅供参考"""
+        try:
+            text, from_alert = self._snapshot_page()
+            m = _ERROR_RE.search(text)
+            return (m.group(0), from_alert) if m else (None, from_alert)
+        except _SELENIUM_ERRORS:
+            return None, False
+
+    def _wait_for_selector(self, selector: str, timeout: int = 10) -> bool:
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.2).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+            )
+            return True
+        except TimeoutException:
+            self.logger.debug(f"等待元素超时: {selector}")
             return False
 
     # =========================
-    # 登录（Cookie 优先）
+    # Cookie 注入
     # =========================
-    def login(self) -> bool:
+    def _inject_cookies(self, cookies_str: str) -> None:
+        pairs = [
+            (name, value)
+            for part in cookies_str.split(";")
+            for name, _, value in [part.strip().partition("=")]
+            if name and value
+        ]
+        if not pairs:
+            self.logger.warning("SITE_COOKIES 中没有有效的 Cookie")
+            return
+
+        # 与 add_cookie 保持一致：通过 url 设置为当前页面主机的 host-only Cookie
+        # （传 domain 会生成同时作用于子域名的域 Cookie）
+        current_url = self.driver.current_url
+        if not urlparse(current_url).hostname:
+            current_url = self._home_url
+        expires = int(time.time()) + _COOKIE_MAX_AGE
+
+        # 优先通过 CDP 一次性写入全部 Cookie
         try:
-            cookies_str = os.getenv("SITE_COOKIES", "").strip()
-            if cookies_str:
-                self.logger.info("检测到 SITE_COOKIES，尝试使用 Cookie 登录")
-
-                # ⚠️ 必须先访问域名
-                self.driver.get(self.base_url)
-                TimingManager.smart_wait(
-                    TimingManager.PAGE_LOAD_DELAY, 1.5, self.logger
-                )
-
-                # ✅ 关键修复：只设置 name + value
-                for cookie in cookies_str.split(";"):
-                    if "=" not in cookie:
-                        continue
-                    name, value = cookie.strip().split("=", 1)
-                    try:
-                        self.driver.add_cookie({
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd(
+                "Network.setCookies",
+                {
+                    "cookies": [
+                        {
                             "name": name,
                             "value": value,
-                        })
-                    except Exception as e:
-                        self.logger.debug(f"添加 Cookie 失败: {name}, {e}")
+                            "url": current_url,
+                            "path": "/",
+                            "expires": expires,
+                        }
+                        for name, value in pairs
+                    ]
+                },
+            )
+            self.logger.debug(f"通过 CDP 批量注入 {len(pairs)} 个 Cookie")
+            return
+        except (AttributeError, WebDriverException) as e:
+            self.logger.debug(f"CDP 注入 Cookie 失败，改为逐个添加: {e}")
+
+        # ✅ 关键修复：不设置 domain，只设置 name + value（及过期时间）
+        for name, value in pairs:
+            try:
+                self.driver.add_cookie({
+                    "name": name,
+                    "value": value,
+                    "expiry": expires,
+                })
+            except Exception as e:
+                self.logger.debug(f"添加 Cookie 失败: {name}, {e}")
 
-                # 刷新页面
-                self.driver.get(self.base_url)
-                TimingManager.smart_wait(
-                    TimingManager.PAGE_LOAD_DELAY, 2.0, self.logger
-                )
+    # =========================
+    # 表单登录辅助
+    # =========================
+    def handle_age_verification(self) -> bool:
+        try:
+            # 多数运行没有年龄验证，先即时检查是否存在，避免无谓的轮询等待
+            if not any(
+                self.element_finder.is_element_present(s) for s in _AGE_SELECTORS
+            ):
+                return False
+            el = self.element_finder.find_clickable_by_selectors(
+                _AGE_SELECTORS, timeout=1
+            )
+            if not el:
+                return False
+            self.logger.info("检测到年龄验证，点击进入")
+            self._click(el)
+            return True
+        except _SELENIUM_ERRORS as e:
+            self.logger.debug(f"处理年龄验证失败: {e}")
+            return False
+
+    def fill_login_form(self) -> bool:
+        try:
+            if not self.driver.execute_script(
+                _FILL_LOGIN_FORM_JS, self.username, self.password
+            ):
+                self.logger.error("未找到登录表单输入框")
+                return False
+            return True
+        except _SELENIUM_ERRORS as e:
+            self.logger.error(f"填写登录表单失败: {e}")
+            return False
+
+    def handle_security_question(self) -> bool:
+        if not self.enable_security_question:
+            return True
+        if not self.security_question:
+            self.logger.error("配置错误：启用安全提问需要设置SECURITY_QUESTION")
+            return False
 
+        try:
+            question_select = self.element_finder.find_by_selectors(
+                _QUESTION_SELECTORS
+            )
+            if not question_select:
+                self.logger.error("未找到安全提问下拉框")
+                return False
+
+            if not self.driver.execute_script(
+                _SELECT_QUESTION_JS, question_select, self.security_question
+            ):
+                self.logger.error(f"未找到匹配的安全提问: {self.security_question}")
+                return False
+
+            answer_input = self.element_finder.find_by_selectors(_ANSWER_SELECTORS)
+            if not answer_input:
+                self.logger.error("未找到安全提问答案输入框")
+                return False
+
+            answer_input.clear()
+            answer_input.send_keys(self.security_answer)
+            return True
+        except _SELENIUM_ERRORS as e:
+            self.logger.error(f"处理安全提问失败: {e}")
+            return False
+
+    # =========================
+    # 登录（Cookie 优先，表单兜底）
+    # =========================
+    def _try_cookie_login(self, cookies_str: str) -> bool:
+        self.logger.info("检测到 SITE_COOKIES，尝试使用 Cookie 登录")
+
+        # ⚠️ 调用前必须已停留在站点域名下（见 login）
+        self._inject_cookies(cookies_str)
+
+        # 原地刷新让 Cookie 生效；CDP Page.reload 不等待导航完成，
+        # 可能在旧页面上命中下面的等待条件，因此使用 refresh
+        self._refresh()
+        self._wait_for_selector(_LOGIN_OUTCOME_SELECTOR)
+
+        if self.check_login_status():
+            self.logger.info("✅ Cookie 登录成功")
+            return True
+
+        error_msg, from_alert = self.check_login_error_message()
+        if error_msg and from_alert:
+            self.logger.warning(f"❌ Cookie 登录未生效: {error_msg}")
+        else:
+            if error_msg:
+                self.logger.debug(f"页面中出现疑似错误文本（非提示框）: {error_msg}")
+            self.logger.warning("❌ Cookie 登录未生效")
+        return False
+
+    def _try_form_login(self) -> bool:
+        self.logger.info("使用账号密码登录")
+
+        self._navigate(self._login_url)
+        self.handle_age_verification()
+        if not self._wait_for_selector(_LOGIN_FORM_SELECTOR):
+            self.logger.error("登录页面加载失败，未找到登录表单")
+            return False
+
+        if not self.fill_login_form():
+            return False
+        if not self.handle_security_question():
+            return False
+
+        submit_button = self.element_finder.find_clickable_by_selectors(
+            _SUBMIT_SELECTORS
+        )
+        if not submit_button:
+            self.logger.error("未找到登录按钮")
+            return False
+        self._click(submit_button)
+        self._wait_for_selector(_SUBMIT_OUTCOME_SELECTOR)
+
+        if self.check_login_status():
+            self.logger.info("✅ 账号密码登录成功")
+            return True
+
+        # 只有站点提示框给出的拒绝信息才终止重试，避免重复提交密码加重账号锁定；
+        # page_source 中的零散匹配可能来自帖子标题等，按普通失败交由重试
+        error_msg, from_alert = self.check_login_error_message()
+        if error_msg and from_alert:
+            self.logger.error(f"❌ 账号密码登录失败: {error_msg}")
+            raise LoginRejectedError(error_msg)
+        self.logger.error("❌ 账号密码登录失败")
+        return False
+
+    def login(self) -> bool:
+        try:
+            cookies_str = os.getenv("SITE_COOKIES", "").strip()
+
+            # 先访问首页：持久化配置目录中的会话可能仍然有效，
+            # Cookie 注入也要求当前页面位于站点域名下
+            if cookies_str or self.config.get("browser_profile_dir"):
+                self._navigate(self._home_url)
+                self._wait_for_selector(_LOGIN_OUTCOME_SELECTOR)
                 if self.check_login_status():
-                    self.logger.info("✅ Cookie 登录成功")
+                    self.logger.info("✅ 浏览器会话仍然有效，无需重新登录")
                     return True
-                else:
-                    self.logger.warning("❌ Cookie 登录未生效")
 
-            self.logger.error("未能通过 Cookie 登录，终止登录流程")
-            return False
+            if cookies_str and self._try_cookie_login(cookies_str):
+                return True
+
+            if not self.username or not self.password:
+                self.logger.error("未能通过 Cookie 登录，且未配置账号密码，终止登录流程")
+                return False
+
+            return self._try_form_login()
 
-        except Exception as e:
+        except _SELENIUM_ERRORS as e:
             self.logger.error(f"登录异常: {e}")
             return False
@@ -52,6 +52,22 @@ except ImportError:
         raise ImportError("请安装selenium: pip install selenium")
 
 
+# 自动化流程不需要的资源：图片、字体、广告与统计脚本
+BLOCKED_URL_PATTERNS = [
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.webp",
+    "*.woff*",
+    "*.ttf",
+    "*/ads/*",
+    "*doubleclick*",
+    "*googletagmanager*",
+    "*google-analytics*",
+]
+
+
 class SafeChrome:
     """安全Chrome驱动包装器"""
 
@@ -179,6 +195,17 @@ class BrowserDriverManager:
                 ]
                 browser_args.extend(ci_args)
 
+            # 持久化浏览器配置目录，跨次运行保留 Cookie、缓存和 localStorage
+            profile_dir = config.get("browser_profile_dir")
+            if profile_dir:
+                self.logger.debug(f"使用持久化浏览器配置目录: {profile_dir}")
+                browser_args.extend(
+                    [
+                        f"--user-data-dir={os.path.abspath(profile_dir)}",
+                        "--profile-directory=Default",
+                    ]
+                )
+
             for arg in browser_args:
                 options.add_argument(arg)
                 self.logger.debug(f"添加浏览器参数: {arg}")
@@ -213,6 +240,10 @@ class BrowserDriverManager:
             options.add_experimental_option("prefs", prefs)
             self.logger.debug("配置浏览器偏好设置: 弹出窗口允许、中文字体支持")
 
+            # DOM可交互即返回，不等待广告、统计等第三方资源加载完成
+            options.page_load_strategy = "eager"
+            self.logger.debug("页面加载策略: eager")
+
             # 创建驱动
             self.logger.debug("开始初始化浏览器实例")
             if UNDETECTED_AVAILABLE:
@@ -225,6 +256,9 @@ class BrowserDriverManager:
 
             self.wait = WebDriverWait(self.driver, 10)
 
+            if config.get("block_resources", True):
+                self._block_resources()
+
             # 获取浏览器信息
             try:
                 browser_version = self.driver.capabilities.get(
@@ -245,6 +279,17 @@ class BrowserDriverManager:
             self.logger.error(f"创建浏览器驱动失败: {e}")
             return False
 
+    def _block_resources(self) -> None:
+        """通过CDP屏蔽图片、字体和广告请求，减少页面加载字节数"""
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd(
+                "Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS}
+            )
+            self.logger.debug(f"已屏蔽 {len(BLOCKED_URL_PATTERNS)} 类资源请求")
+        except Exception as e:
+            self.logger.debug(f"屏蔽资源请求失败: {e}")
+
     def get_driver(self):
         """获取WebDriver实例"""
         return self.driver
@@ -12,7 +12,7 @@ from datetime import datetime
 from .config import ConfigManager
 from .logger import LoggerManager
 from ..browser.driver import BrowserDriverManager
-from ..automation.signin import SignInManager
+from ..automation.signin import SignInManager, LoginRejectedError
 from ..automation.humanlike import HumanlikeBehavior
 from ..utils.retry import RetryManager
 from ..utils.timing import TimingManager
@@ -415,6 +415,10 @@ class AutoSignApp:
                         f"登录失败，第 {retry_count} 次尝试，还剩 {remaining} 次重试机会"
                     )
 
+            except LoginRejectedError as e:
+                self.logger.error(f"登录被站点拒绝，停止重试: {e}")
+                return False  # 重试只会重复提交密码，加重账号锁定
+
             except Exception as e:
                 retry_count = self.retry_manager.get_retry_count(operation)
                 remaining = self.retry_manager.get_remaining_retries(operation)
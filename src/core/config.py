@@ -40,6 +40,9 @@ class ConfigManager:
                 "password": os.getenv("SITE_PASSWORD", "").strip(),
                 "base_url": os.getenv("BASE_URL", "https://www.sehuatang.org"),
                 "headless": os.getenv("HEADLESS", "true").lower() == "true",
+                "browser_profile_dir": os.getenv("BROWSER_PROFILE_DIR", "").strip(),
+                "block_resources": os.getenv("BLOCK_RESOURCES", "true").lower()
+                == "true",
                 "log_level": os.getenv("LOG_LEVEL", "DEBUG").upper(),
             }
         )
@@ -260,6 +263,8 @@ class ConfigManager:
         return {
             "headless": self._config["headless"],
             "base_url": self._config["base_url"],
+            "browser_profile_dir": self._config["browser_profile_dir"],
+            "block_resources": self._config["block_resources"],
         }
 
     def get_auth_config(self) -> Dict[str, Any]: